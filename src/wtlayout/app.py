@@ -1,84 +1,251 @@
 #!/usr/bin/python3
 
 import argparse
-import collections
 import copy
+import functools
+import itertools
 import os
 import pathlib
 import string
 import subprocess
-import xml.etree.ElementTree as ET
+import types
+from typing import Callable, Iterator
 
 # mslex is shlex but for Windows; this ensures the 'process' string is correctly passed
 import mslex
 
 from .layout import Action, LayoutDirection, LayoutTab, Pane, PaneGroup, Window
 
+try:
+    # lxml parses and copies elements considerably faster than the stdlib; it keeps comments
+    # and processing instructions as nodes by default, so strip those out during parsing
+    from lxml import etree as ET
 
-def _process_template(template: ET.Element, impl: ET.Element) -> ET.Element:
+    _PARSER = ET.XMLParser(remove_comments=True, remove_pis=True)
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+    _PARSER = None
+
+
+def _compile_value(value: str) -> tuple[str, str, str] | string.Template:
+    # a value with a single placeholder is split up around it, so substituting it is just a
+    # concatenation; anything else (multiple placeholders, escapes) goes through string.Template
+    if value.count("$") == 1:
+        match = string.Template.pattern.search(value)
+        name = match.group("named") or match.group("braced")
+        if name:
+            return value[: match.start()], name, value[match.end() :]
+    return string.Template(value)
+
+
+# an attribute to substitute: the position of its element in the template, its key, and its
+# compiled value
+_Substitution = tuple[int, str, tuple[str, str, str] | string.Template]
+
+
+def _compile_template(template: ET.Element) -> list[_Substitution]:
+    # collects the attributes of a template that need substitution
+    # each entry is keyed by the position of its element within the template in document order;
+    # attributes with no '$' can't reference anything, so they're left out
+    substitutions = []
+    for index, element in enumerate(template[0].iter()):
+        for key, value in element.items():
+            if "$" not in value:
+                continue
+            substitutions.append((index, key, _compile_value(value)))
+    return substitutions
+
+
+def _process_template(
+    template: ET.Element,
+    impl: ET.Element,
+    compiled_templates: dict[ET.Element, list[_Substitution]],
+) -> ET.Element:
     # substitutes value items from a template element with attributes from a 'preset' element
     # we currently only support one element
+    # templates are compiled once per walk, so the cache doesn't outlive the parsed layout
+    substitutions = compiled_templates.get(template)
+    if substitutions is None:
+        substitutions = compiled_templates[template] = _compile_template(template)
+    if not substitutions:
+        # nothing to substitute; the walk never modifies elements, so the template can be shared
+        return template[0]
+
+    # substitutions are in document order, so elements after the last one can be skipped
     resolved = copy.deepcopy(template[0])
-    for element in resolved.iter():
-        for key, value in element.items():
-            t = string.Template(value)
-            element.set(key, t.substitute(impl.attrib))
+    elements = list(itertools.islice(resolved.iter(), substitutions[-1][0] + 1))
+    for index, key, value in substitutions:
+        if isinstance(value, tuple):
+            prefix, name, suffix = value
+            elements[index].set(key, prefix + impl.attrib[name] + suffix)
+        else:
+            elements[index].set(key, value.substitute(impl.attrib))
     return resolved
 
 
-def _get_unvenv() -> dict[str, str]:
+@functools.cache
+def _get_unvenv() -> types.MappingProxyType[str, str]:
     # HACK: resets the environment such that the subprocess doesn't have the virtualenv
     # this effectively simulates running the default 'deactivate.bat'
     # wt will otherwise run the process with the given environment
-    env: dict[str, str | None] = dict(os.environ.copy())
-    env.update(
-        {
-            "PROMPT": env.pop("_OLD_VIRTUAL_PROMPT", None),
-            "PYTHONHOME": env.pop("_OLD_VIRTUAL_PYTHONHOME", None),
-            "PATH": env.pop("_OLD_VIRTUAL_PATH", None),
-        }
-    )
+    # the parent environment doesn't change during a run, so this is computed once; the result
+    # is read-only since it's shared between callers
+    env = os.environ.copy()
+    for k in ("PROMPT", "PYTHONHOME", "PATH"):
+        value = env.pop(f"_OLD_VIRTUAL_{k}", None)
+        if value is None:
+            env.pop(k, None)
+        else:
+            env[k] = value
     for k in ("VIRTUAL_ENV", "VIRTUAL_ENV_PROMPT"):
         env.pop(k, None)
-    return {k: v for k, v in env.items() if v is not None}
+    return types.MappingProxyType(env)
 
 
-def _walk(element: ET.Element, template_registry: collections.ChainMap) -> Action:
-    child_registry = template_registry.new_child()
+# marks a template name that wasn't registered before an element shadowed it
+_UNREGISTERED = object()
 
+
+def _register_templates(
+    element: ET.Element,
+    template_registry: dict[str, ET.Element],
+    shadowed: dict[str, object],
+) -> None:
+    # templates are visible to the element declaring them and all of its descendants; whatever
+    # they replace in the registry is recorded so it can be restored after the element is walked
     for template in element.findall("template"):
         name = template.attrib.get("name")
-        child_registry[name] = template
-
-    children = [
-        _walk(child, child_registry)
-        for child in element
-        if child.tag != "template" and child is not None
-    ]
-    if element.tag == "window":
-        return Window(*children)
-    elif element.tag == "tab":
-        return LayoutTab(*children)
-    elif element.tag in ("row", "column"):
-        weights = None
-        if element.attrib.get("weights"):
-            weights = list(map(float, element.attrib.get("weights").split()))
-        return PaneGroup(
-            LayoutDirection.COLUMN if element.tag == "column" else LayoutDirection.ROW,
-            children,
-            weights=weights,
-        )
-    elif element.tag == "pane":
-        process = None
-        if "process" in element.attrib:
-            process = mslex.split(element.attrib.get("process"))
-        return Pane(starting_directory=element.attrib.get("directory"), process=process)
-    elif element.tag == "preset":
+        shadowed.setdefault(name, template_registry.get(name, _UNREGISTERED))
+        template_registry[name] = template
+
+
+def _unregister_templates(
+    template_registry: dict[str, ET.Element], shadowed: dict[str, object]
+) -> None:
+    for name, template in shadowed.items():
+        if template is _UNREGISTERED:
+            del template_registry[name]
+        else:
+            template_registry[name] = template
+
+
+def _enter(
+    element: ET.Element,
+    template_registry: dict[str, ET.Element],
+    expanding: set[ET.Element],
+    compiled_templates: dict[ET.Element, list[_Substitution]],
+) -> tuple[
+    ET.Element,
+    dict[str, object],
+    list[ET.Element],
+    Iterator[ET.Element],
+    list[Action],
+]:
+    # creates a traversal frame for an element: the element itself, the templates it shadows
+    # in the registry, the templates it expanded, the children that have yet to be visited, and
+    # the actions built from the children visited so far
+    shadowed: dict[str, object] = {}
+    _register_templates(element, template_registry, shadowed)
+
+    # presets are replaced by their resolved template before any of their children are visited
+    # templates that are being expanded by this frame or its ancestors can't be expanded again,
+    # otherwise a template that (directly or indirectly) references itself never terminates
+    expanded: list[ET.Element] = []
+    while element.tag == "preset":
         preset_type = element.attrib.get("name")
-        if preset_type not in child_registry:
+        # a preset's own children are never walked, so anything other than templates is an error
+        for child in element:
+            if child.tag != "template":
+                raise ValueError(f"Unexpected tag '{child.tag}' in preset '{preset_type}'")
+        if preset_type not in template_registry:
             raise ValueError(f"Unknown preset template name '{preset_type}'")
-        return _walk(_process_template(child_registry[preset_type], element), child_registry)
-    raise ValueError(f"Unknown tag '{element.tag}'")
+        template = template_registry[preset_type]
+        if template in expanding:
+            raise ValueError(f"Preset template '{preset_type}' references itself")
+        expanding.add(template)
+        expanded.append(template)
+        element = _process_template(template, element, compiled_templates)
+
+        _register_templates(element, template_registry, shadowed)
+
+    children = (child for child in element if child.tag != "template")
+    return element, shadowed, expanded, children, []
+
+
+# templates expanded by multiple presets repeat the same attribute values, so the parsed forms
+# are cached by value; the results are tuples since they're shared
+@functools.cache
+def _parse_weights(weights: str) -> tuple[float, ...]:
+    return tuple(map(float, weights.split()))
+
+
+@functools.cache
+def _split_process(process: str) -> tuple[str, ...]:
+    return tuple(mslex.split(process))
+
+
+def _handle_window(element: ET.Element, children: list[Action]) -> Action:
+    return Window(*children)
+
+
+def _handle_tab(element: ET.Element, children: list[Action]) -> Action:
+    return LayoutTab(*children)
+
+
+def _handle_row_column(element: ET.Element, children: list[Action]) -> Action:
+    weights = element.attrib.get("weights")
+    return PaneGroup(
+        LayoutDirection.COLUMN if element.tag == "column" else LayoutDirection.ROW,
+        children,
+        weights=list(_parse_weights(weights)) if weights else None,
+    )
+
+
+def _handle_pane(element: ET.Element, children: list[Action]) -> Action:
+    attrib = element.attrib
+    process = attrib.get("process")
+    return Pane(
+        starting_directory=attrib.get("directory"),
+        process=list(_split_process(process)) if process is not None else None,
+    )
+
+
+# builds an action from an element and the actions of its children
+# presets don't need a handler; they're expanded into their template when visited
+_HANDLERS: dict[str, Callable[[ET.Element, list[Action]], Action]] = {
+    "window": _handle_window,
+    "tab": _handle_tab,
+    "row": _handle_row_column,
+    "column": _handle_row_column,
+    "pane": _handle_pane,
+}
+
+
+def _walk(element: ET.Element, template_registry: dict[str, ET.Element]) -> Action:
+    # post-order traversal using an explicit stack instead of recursing on every element;
+    # an element's action is built once all of its children have been built
+    expanding: set[ET.Element] = set()
+    compiled_templates: dict[ET.Element, list[_Substitution]] = {}
+    stack = [_enter(element, template_registry, expanding, compiled_templates)]
+    while True:
+        element, shadowed, expanded, pending, children = stack[-1]
+        child = next(pending, None)
+        if child is not None:
+            stack.append(_enter(child, template_registry, expanding, compiled_templates))
+            continue
+
+        stack.pop()
+        _unregister_templates(template_registry, shadowed)
+        expanding.difference_update(expanded)
+        handler = _HANDLERS.get(element.tag)
+        if handler is None:
+            raise ValueError(f"Unknown tag '{element.tag}'")
+        action = handler(element, children)
+        if not stack:
+            return action
+        *_, siblings = stack[-1]
+        siblings.append(action)
 
 
 def main() -> None:
@@ -88,6 +255,10 @@ def main() -> None:
 
     args = parser.parse_args()
 
-    root = ET.fromstring(args.file.read_text("utf8"))
-    result = _walk(root, collections.ChainMap())
-    subprocess.run([os.path.expandvars(s) for s in result.command()], env=_get_unvenv())
+    # the parser reads the file in chunks rather than needing all of it in memory up front
+    with args.file.open("rb") as f:
+        root = ET.parse(f, _PARSER).getroot()
+    result = _walk(root, {})
+    # most tokens are flags or separators; only those with a variable sigil need expanding
+    command = [os.path.expandvars(s) if "%" in s or "$" in s else s for s in result.command()]
+    subprocess.run(command, env=dict(_get_unvenv()))
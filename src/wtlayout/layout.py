@@ -2,22 +2,9 @@
 
 import dataclasses
 import enum
-import itertools
-from typing import Iterator, TypeVar
 
-T = TypeVar("T")
-
-
-def iterjoin(sep: T, iterables: Iterator[T]) -> Iterator[T]:
-    """
-    Yields iterable items, yielding a separator between each iterable after the first.
-
-    [ a, b, c ] -> iter(a, sep, b, sep, c)
-    """
-    yield next(iterables)
-    for iter in iterables:
-        yield sep
-        yield iter
+# targets the most recently used terminal window
+_WT_PREFIX = ("wt", "-w", "0")
 
 
 def subcmd_join(*cmds: list[str]) -> list[str]:
@@ -25,24 +12,26 @@ def subcmd_join(*cmds: list[str]) -> list[str]:
     Given a list of subcmds (which itself a list of args), returns a flattened arg list with
     semicolons in between each subcmd.
 
-    [ [ a, b, c ], [ d, e, f ] ] -> iter(a, b, c, ';', d, e, f)
+    [ [ a, b, c ], [ d, e, f ] ] -> [ a, b, c, ';', d, e, f ]
     """
-    return list(itertools.chain.from_iterable(iterjoin([";"], iter(cmds))))
-
-
-def pairwise_longest(iterable: Iterator[T]) -> Iterator[tuple[T, T]]:
-    "s -> (s0,s1), (s1,s2), (s2, s3), ..., (sN-1,sN), (sN,None)"
-    a, b = itertools.tee(iterable)
-    next(b, None)
-    return itertools.zip_longest(a, b, fillvalue=None)
+    if not cmds:
+        return []
+    result = list(cmds[0])
+    for cmd in cmds[1:]:
+        result.append(";")
+        result.extend(cmd)
+    return result
 
 
 class Action:
+    # lets subclasses declare slots without also picking up a __dict__
+    __slots__ = ()
+
     def command(self) -> list[str]:
         raise NotImplementedError
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Window(Action):
     subcmds: list[Action]
 
@@ -53,12 +42,12 @@ class Window(Action):
         # pop the first subcommand so the delimiter isn't inserted until after the first command
         # otherwise WT will open a tab up front
         return subcmd_join(
-            ["wt", "-w", "0"] + self.subcmds[0].command(),
+            [*_WT_PREFIX, *self.subcmds[0].command()],
             *(s.command() for s in self.subcmds[1:]),
         )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Pane(Action):
     """
     Holds options available to both new-tab and split-pane commands.
@@ -82,19 +71,23 @@ class Pane(Action):
         # this needs to be executed last since it includes the process string
         result = []
         if self.title:
-            result.extend(["--title", self.title])
+            result.append("--title")
+            result.append(self.title)
         if self.starting_directory:
-            result.extend(["-d", self.starting_directory])
+            result.append("-d")
+            result.append(self.starting_directory)
         if self.profile:
-            result.extend(["-p", self.profile])
+            result.append("-p")
+            result.append(self.profile)
         if self.tab_color:
-            result.extend(["--tabColor", "#{:0>6x}".format(self.tab_color)])
+            result.append("--tabColor")
+            result.append(f"#{self.tab_color:0>6x}")
         if self.process:
             result.extend(self.process)
         return result
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Tab(Pane):
     def command(self) -> list[str]:
         return ["nt"] + self.options()
@@ -105,7 +98,7 @@ class SplitDirection(enum.Enum):
     VERTICAL = enum.auto()
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class LayoutTab(Action):
     # can have a regular Pane or a PaneGroup
     pane: Pane = dataclasses.field(default_factory=Pane)
@@ -119,7 +112,14 @@ class LayoutDirection(enum.Enum):
     COLUMN = enum.auto()  # items are inserted from top to bottom
 
 
-@dataclasses.dataclass
+# split-pane orientation, then the move-focus directions to the previous and next pane
+_SPLIT_TOKENS = {
+    LayoutDirection.ROW: ("-V", "left", "right"),
+    LayoutDirection.COLUMN: ("-H", "up", "down"),
+}
+
+
+@dataclasses.dataclass(slots=True)
 class PaneGroup:
     """
     A group of panes or nested pane groups.  Panes are created in order from left to right, top
@@ -144,11 +144,10 @@ class PaneGroup:
         return self.panes[0].root
 
     def sibling_options(self) -> list[str]:
-        commands = []
+        # subcmds are appended directly, with a separator between each one
+        result: list[str] = []
 
-        orientation, focus_prev, focus_next = "-V", "left", "right"
-        if self.layout == LayoutDirection.COLUMN:
-            orientation, focus_prev, focus_next = "-H", "up", "down"
+        orientation, focus_prev, focus_next = _SPLIT_TOKENS[self.layout]
 
         # compute the split amount required on each split
         if not self.weights:
@@ -159,19 +158,22 @@ class PaneGroup:
         else:
             # split so current pane takes P% of the space (and next pane is 100-P%)
             # P is (fraction of current / remaining weights)
-            split_weights = [
-                1 - (self.weights[n] / sum(self.weights[n:]))
-                for n in range(self.num_subpanes - 1)
-            ]
-
-        for w, (pane_prev, pane) in itertools.zip_longest(
-            split_weights, pairwise_longest(self.panes), fillvalue=None
-        ):
+            split_weights = []
+            remaining = sum(self.weights)
+            for weight in self.weights[: self.num_subpanes - 1]:
+                split_weights.append(1 - (weight / remaining))
+                remaining -= weight
+
+        num_panes = len(self.panes)
+        for n, pane_prev in enumerate(self.panes):
+            # the last pane doesn't have a next pane (or split weight) to go with it
+            pane = self.panes[n + 1] if n + 1 < num_panes else None
             if pane:
                 # create the next pane before working on our previous one to finalize positioning
-                commands.append(
-                    ["sp", orientation, "-s", str(round(w, 4))] + pane.root.options()
-                )
+                if result:
+                    result.append(";")
+                result.extend(["sp", orientation, "-s", str(round(split_weights[n], 4))])
+                result.extend(pane.root.options())
 
             # perform nested split operations if necessary
             if pane_prev.num_subpanes > 1:
@@ -179,17 +181,24 @@ class PaneGroup:
                 # any nested splitting occurs; if we are at the end, we don't have a pane, so we
                 # just operate on the the currently focused one
                 if pane:
-                    commands.append(["mf", focus_prev])
+                    result.extend([";", "mf", focus_prev])
 
-                commands.append(pane_prev.sibling_options())
+                if result:
+                    result.append(";")
+                result.extend(pane_prev.sibling_options())
 
                 if pane:
-                    commands.append(["mf", focus_next])
+                    result.extend([";", "mf", focus_next])
 
-        return subcmd_join(*commands)
+        return result
 
     def options(self) -> list[str]:
         # the first pane needs to have its options passed directly, since it's for a previous command
         # (either new-tab or split-pane)
-        commands = [self.panes[0].root.options()] + [self.sibling_options()]
-        return subcmd_join(*commands)
+        result = self.panes[0].root.options()
+        sibling_options = self.sibling_options()
+        if sibling_options:
+            # a group with a single pane has no siblings to split out
+            result.append(";")
+            result.extend(sibling_options)
+        return result